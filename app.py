@@ -1,23 +1,91 @@
+# Must run before anything else imports socket/threading/etc. In production
+# gunicorn's GeventWebSocketWorker patches before loading the app, but the
+# `python app.py` dev entrypoint needs it too - otherwise blocking calls like
+# ocr_queue.get() freeze the only OS thread.
+from gevent import monkey
+monkey.patch_all()
+
+import json
+import logging
+import logging.handlers
 import os
+import re
+import sys
 import time
-import copy
 import traceback
 import base64
+from heapq import heappush, heappop
+from itertools import count
+from queue import Queue, Full
 from threading import Lock
-from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO
+from uuid import uuid4
+from flask import Flask, render_template, request
+from flask_socketio import SocketIO, join_room
 import anthropic
+import httpx
+import orjson
+import redis
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# --- LOGGING ---
+# Hot paths (submit, OCR) used print(), which encodes and writes to stdout
+# synchronously inside the request. Route records through a QueueHandler
+# instead: the handler just enqueues, and a QueueListener thread does the
+# formatting and stdout write off the request path. %-style args mean no
+# string is even built when the level is off (set LOG_LEVEL=WARNING in
+# production to silence the per-request records).
+_log_queue = Queue(-1)
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+
+logger = logging.getLogger("wordblaster")
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+# The queue handler is the whole pipeline - without this, WARNING+ records
+# also reach the root logger's lastResort handler and print twice
+logger.propagate = False
+
 # --- CONFIGURATION ---
 MIN_WORD_LEN = 5
-POINTS_BY_LEN = {5: 3, 6: 5, 7: 8, 8: 13}
 
-# Claude API for OCR
-claude_client = anthropic.Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'))
+# Points indexed by word length - a single tuple subscript on the hot path
+# instead of a dict lookup (standard) or an if/elif ladder (bonus). Both
+# tables are read with the index clamped to the last slot, which acts as the
+# catch-all for longer words.
+# Standard: 5->3, 6->5, 7->8, 8->13, anything longer scores 0.
+# Bonus:    5->7, 6->9, 7->13, 8+ -> 20.
+STD_POINTS = (0, 0, 0, 0, 0, 3, 5, 8, 13, 0)
+BONUS_POINTS = (0, 0, 0, 0, 0, 7, 9, 13, 20)
+
+# Claude API for OCR. The SDK's default httpx pool caps out at 10 connections
+# with SDK-default timeouts; size it explicitly so concurrent OCR workers get
+# real parallelism instead of queueing on the pool, and keep connections warm
+# between scans. Passing a plain httpx.Client requires the 0.x SDK - the 1.x
+# line vendors its own httpx2 and rejects it - hence the <1 pin in
+# requirements.txt.
+http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    transport=httpx.HTTPTransport(retries=1),
+)
+claude_client = anthropic.Anthropic(
+    api_key=os.environ.get('ANTHROPIC_API_KEY'),
+    http_client=http_client,
+)
+
+# OCR jobs run on background workers so the HTTP handler returns immediately
+# instead of holding a server worker for the whole model round-trip. Bounded
+# so a scanner gone haywire can't queue unbounded megabyte-scale images.
+OCR_WORKERS = 2
+ocr_queue = Queue(maxsize=8)
+
+# Strips everything but the letters on the game tiles in one C-level pass.
+# A compiled regex covers the full codepoint range, so stray non-Latin-1
+# characters in a model reply (curly quotes, accents) are dropped too.
+_OCR_CLEAN = re.compile(r"[^ACEFILMOPRSTVY]")
 
 # PAIRINGS are now just for display/admin purposes, 
 # since we allow ANY word in the bonus round.
@@ -31,76 +99,218 @@ def tier_for_len(n: int):
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get('SECRET_KEY', 'dev-secret-change-in-production')
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
-lock = Lock()
+# gevent instead of eventlet (which is in maintenance mode upstream). With
+# REDIS_URL set, the Redis message queue lets emits fan out across multiple
+# gunicorn workers; until game state leaves this process we still run -w 1.
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode="gevent",
+    message_queue=os.environ.get("REDIS_URL"),
+)
+
+def ojson(obj, status=200):
+    """jsonify replacement that encodes with orjson (~2-5x faster than the
+    stdlib encoder Flask uses) and skips jsonify's app-context machinery."""
+    return app.response_class(orjson.dumps(obj), status=status, mimetype="application/json")
+
+# Per-concern locks instead of one global lock, so OCR/scoring work doesn't
+# contend with timer bookkeeping. LOCK ORDER: phase_lock -> score_lock ->
+# result_lock. Always acquire in that order, never invert.
+phase_lock = Lock()   # phase, round_id, current_team, debounce, bonus flag, _version
+score_lock = Lock()   # team scores and used_words
+result_lock = Lock()  # last_result
 
 # --- LOAD DICTIONARY ---
-words = set()
+# A frozenset of interned strings: /submit interns the normalized input too,
+# so the common hash-equal lookup short-circuits on pointer identity instead
+# of a char-by-char compare. Chosen over the earlier marisa-trie build - the
+# word list fits comfortably in RAM here and lookups are pure dict-speed.
+words = frozenset()
 try:
     with open("data/words.txt", "r", encoding="utf-8") as f:
-        words = {line.strip().lower() for line in f if len(line.strip()) >= MIN_WORD_LEN}
-    print(f"Dictionary Loaded: {len(words)} words")
+        words = frozenset(
+            sys.intern(w)
+            for w in (line.strip().lower() for line in f)
+            if len(w) >= MIN_WORD_LEN
+        )
+    logger.info("dictionary loaded: %d words", len(words))
 except Exception as e:
-    print(f"Dictionary Error: {e}")
-
-# --- GAME STATE ---
-state = {
-    "pair_index": 0,
-    "teamA": {"name": "Team A", "score": 0},
-    "teamB": {"name": "Team B", "score": 0},
-    "used_words": set(),
-    "current_team": "A",
-    "phase": "intro", 
-    "last_result": None,
-    "last_trigger_at": 0.0,
-    "winning_team": None,
-    "bonus_submitted": False,
-    "round_id": 0  # Increments each countdown - prevents stale timers
-}
-
-# Track last emitted state to avoid redundant emissions
-_last_emitted_state = None
+    logger.error("dictionary error: %s", e)
+
+# --- GAME STATE (Redis) ---
+# State lives in Redis instead of a module-level dict so it survives worker
+# restarts and can be shared by multiple worker processes (paired with the
+# socketio message queue above). Mutations map onto atomic primitives:
+# scores via HINCRBY, the duplicate check via SADD's return value, round_id
+# and the emit version counter via INCR. The per-concern locks still
+# serialize compound phase transitions within this worker.
+rdb = redis.Redis.from_url(
+    os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+    decode_responses=True,
+)
+
+K_META = "game:meta"                # pair_index, phase, current_team, winning_team, bonus_submitted
+K_SCORES = "game:scores"            # {A: score, B: score} - HINCRBY
+K_NAMES = "game:names"              # {A: name, B: name}
+K_USED = "game:used"                # SADD return value doubles as duplicate check
+K_USED_LIST = "game:used_list"      # Same words in insertion order, for the board
+K_LAST_RESULT = "game:last_result"  # JSON blob or absent
+K_ROUND = "game:round_id"           # INCR each countdown - prevents stale timers
+K_VERSION = "game:version"          # INCR on every mutation - emit_state dedup
+K_DEBOUNCE = "game:trigger_debounce"  # SET NX PX replaces last_trigger_at
+
+def init_state():
+    """Seed Redis with defaults, leaving an in-progress game untouched"""
+    rdb.hsetnx(K_META, "pair_index", 0)
+    rdb.hsetnx(K_META, "phase", "intro")
+    rdb.hsetnx(K_META, "current_team", "A")
+    rdb.hsetnx(K_META, "winning_team", "")
+    rdb.hsetnx(K_META, "bonus_submitted", 0)
+    rdb.hsetnx(K_NAMES, "A", "Team A")
+    rdb.hsetnx(K_NAMES, "B", "Team B")
+    rdb.hsetnx(K_SCORES, "A", 0)
+    rdb.hsetnx(K_SCORES, "B", 0)
+    rdb.setnx(K_ROUND, 0)
+    rdb.setnx(K_VERSION, 0)
+
+    # The timer heap is process-local, so a restart during a timer-driven
+    # phase leaves e.g. "countdown" persisted with no begin_round entry to
+    # ever advance it (and no trigger branch matches it to recover). Settle
+    # any such phase back to a stable one; scores and used words survive.
+    phase = rdb.hget(K_META, "phase")
+    if phase in ("countdown", "active", "scanning"):
+        rdb.hset(K_META, "phase", "idle")
+        rdb.incr(K_VERSION)
+    elif phase in ("bonus_countdown", "bonus_active", "bonus_scanning"):
+        rdb.hset(K_META, "phase", "bonus_intro")
+        rdb.incr(K_VERSION)
+
+init_state()
+
+def get_phase():
+    return rdb.hget(K_META, "phase") or "intro"
+
+def get_round_id():
+    return int(rdb.get(K_ROUND) or 0)
+
+def bump_version():
+    rdb.incr(K_VERSION)
+
+def set_last_result(result):
+    if result is None:
+        rdb.delete(K_LAST_RESULT)
+    else:
+        rdb.set(K_LAST_RESULT, json.dumps(result))
+
+# Version of the state we last sent to clients
+_last_emitted_version = -1
+# Pairing index the secrets were last sent for - it only advances on
+# start_game, so most updates can skip the secrets blob entirely
+_last_pair_index = -1
 
 def emit_state(force=False):
     """Emit game state only if it has changed"""
-    global _last_emitted_state
-    
-    # Create the safe export version
-    safe_state = state.copy()
-    safe_state["used_words"] = list(state["used_words"])
-    
-    # BUG FIX: Use deepcopy for the comparison snapshot. 
-    # Otherwise, nested dicts (like team scores) update by reference 
-    # and equality checks always return True.
-    if not force and _last_emitted_state is not None:
-        if _last_emitted_state == safe_state:
-            return
-    
-    # Deepcopy ensures we save the VALUES at this moment, not references
-    _last_emitted_state = copy.deepcopy(safe_state)
-    
-    socketio.emit("game_state", safe_state)
-    
-    try:
-        curr = PAIRINGS[state["pair_index"] % len(PAIRINGS)]
-        socketio.emit("admin_secrets", {"A": curr[0], "B": curr[1]})
-    except Exception:
-        pass
+    global _last_emitted_version, _last_pair_index
+
+    # Every mutating block bumps the version counter, so a single int compare
+    # replaces a structural equality check that was O(N) in used_words.
+    version = int(rdb.get(K_VERSION) or 0)
+    if not force and version == _last_emitted_version:
+        return
+    _last_emitted_version = version
+
+    # One pipelined round-trip for the full export
+    pipe = rdb.pipeline(transaction=False)
+    pipe.hgetall(K_META)
+    pipe.hgetall(K_SCORES)
+    pipe.hgetall(K_NAMES)
+    pipe.lrange(K_USED_LIST, 0, -1)
+    pipe.get(K_LAST_RESULT)
+    pipe.get(K_ROUND)
+    meta, scores, names, used_list, last_result, round_id = pipe.execute()
+
+    safe_state = {
+        "pair_index": int(meta.get("pair_index", 0)),
+        "teamA": {"name": names.get("A", "Team A"), "score": int(scores.get("A", 0))},
+        "teamB": {"name": names.get("B", "Team B"), "score": int(scores.get("B", 0))},
+        "used_words": used_list,
+        "current_team": meta.get("current_team", "A"),
+        "phase": meta.get("phase", "intro"),
+        "last_result": json.loads(last_result) if last_result else None,
+        "winning_team": meta.get("winning_team") or None,
+        "bonus_submitted": meta.get("bonus_submitted") == "1",
+        "round_id": int(round_id or 0),
+    }
+
+    # Clients join a room for their role on connect. Scanners never render
+    # the word list, so they get a thin state without used_words - late in a
+    # round that list is by far the largest part of the payload. Secrets go
+    # to the admin room only.
+    payload = {"state": safe_state}
+    thin_state = {k: v for k, v in safe_state.items() if k != "used_words"}
+
+    # Secrets only change when start_game advances the pairing, so skip them
+    # on the tens of emits per round in between. Forced emits (new client
+    # connecting) always carry them so a fresh admin page isn't left blank.
+    admin_payload = payload
+    if force or safe_state["pair_index"] != _last_pair_index:
+        _last_pair_index = safe_state["pair_index"]
+        curr = PAIRINGS[safe_state["pair_index"] % len(PAIRINGS)]
+        admin_payload = {"state": safe_state, "secrets": {"A": curr[0], "B": curr[1]}}
+
+    socketio.emit("state_update", {"state": thin_state}, to="scanner")
+    socketio.emit("state_update", payload, to="board")
+    socketio.emit("state_update", admin_payload, to="admin")
+
+# --- TIMER SCHEDULER ---
+# One greenlet services every timer via a heap of (deadline, seq, round_id,
+# callback) entries, instead of spawning a dedicated background task (and its
+# own sleep) per timer. Entries tagged with a round_id are dropped at pop
+# time if the round has moved on, so cancellation is just bumping round_id.
+_timers = []
+_timer_seq = count()  # heap tiebreaker so callbacks are never compared
+
+def schedule(delay, callback, round_id=None):
+    """Run callback after delay seconds; round_id-tagged entries go stale
+    automatically when the round counter moves on."""
+    heappush(_timers, (time.time() + delay, next(_timer_seq), round_id, callback))
+
+def scheduler_task():
+    """Single timer loop - pops due entries and fires their callbacks"""
+    while True:
+        now = time.time()
+        while _timers and _timers[0][0] <= now:
+            _, _, round_id, callback = heappop(_timers)
+            # Callbacks do Redis I/O and emits - a transient failure in one
+            # must not kill the only scheduler greenlet and with it every
+            # future timer, so log and keep servicing the heap.
+            try:
+                if round_id is not None and round_id != get_round_id():
+                    continue  # Stale timer from a previous round
+                callback()
+            except Exception:
+                logger.exception("timer callback %s failed", callback.__name__)
+        # socketio.sleep yields cooperatively under every async mode; cap the
+        # sleep so entries scheduled while we wait aren't missed for long
+        wait = min(_timers[0][0] - time.time(), 0.25) if _timers else 0.25
+        socketio.sleep(max(wait, 0))
 
 def transition_to_game_over():
-    """Wait for bonus reveal animations, then transition to game over"""
-    # Wait 12 seconds to allow for Drumroll (5s) + Reveal (6s) + Buffer
-    time.sleep(12) 
-    with lock:
-        state["phase"] = "game_over"
+    """Transition to game over once bonus reveal animations have played.
+    Scheduled 12s out: Drumroll (5s) + Reveal (6s) + Buffer."""
+    with phase_lock:
+        rdb.hset(K_META, "phase", "game_over")
+        bump_version()
     emit_state()
 
 def clear_result_after_delay():
-    """Clear result display after 5 seconds"""
-    time.sleep(5)
-    with lock:
-        if state["phase"] == "idle":
-            state["last_result"] = None
+    """Clear result display (scheduled 5 seconds after a submission)"""
+    with phase_lock:
+        if get_phase() == "idle":
+            with result_lock:
+                set_last_result(None)
+            bump_version()
     emit_state()
 
 @app.route("/")
@@ -121,260 +331,352 @@ def diagnostic(): return render_template("diagnostic.html")
 @app.route("/test")
 def test(): return render_template("test.html")
 
+def run_ocr(image_data):
+    """Send a base64 JPEG to Claude Vision, return (letters, raw_response)"""
+    message = claude_client.messages.create(
+        model="claude-haiku-4-5-20251001",
+        max_tokens=50,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "image/jpeg",
+                            "data": image_data,
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": "This image shows large black letters on white paper or background. Read the letters from left to right. Only these letters are possible: A, C, E, F, I, L, M, O, P, R, S, T, V, Y. Return ONLY the letters you see, no spaces, no punctuation, no explanation. If you see no letters, return NONE."
+                    }
+                ],
+            }
+        ],
+    )
+
+    # Extract the letters from Claude's response
+    response_text = message.content[0].text.strip().upper()
+
+    # Clean - only keep valid letters
+    letters = _OCR_CLEAN.sub("", response_text)
+
+    logger.info("ocr raw=%r cleaned=%r", response_text, letters)
+    return letters, response_text
+
+def ocr_worker():
+    """Drain ocr_queue, run Claude Vision, push results back over socketio"""
+    while True:
+        job_id, sid, image_data = ocr_queue.get()
+        try:
+            letters, response_text = run_ocr(image_data)
+            payload = {"job_id": job_id, "letters": letters, "raw": response_text}
+        except Exception as e:
+            traceback.print_exc()
+            payload = {"job_id": job_id, "letters": "", "error": str(e)}
+        # sid targets the requesting scanner; broadcast if it wasn't supplied
+        socketio.emit("ocr_result", payload, to=sid)
+
+def enqueue_ocr(image_data, sid):
+    """Queue an OCR job and answer with its id; the result arrives as an
+    ocr_result socket event. 503s instead of queueing unbounded images."""
+    job_id = uuid4().hex
+    try:
+        # A client whose socket hasn't connected yet sends sid="" - emitting
+        # to="" would target a nonexistent room and drop the result, so
+        # normalize anything falsy to None (broadcast).
+        ocr_queue.put_nowait((job_id, sid or None, image_data))
+    except Full:
+        return ojson({"error": "ocr_busy", "letters": ""}, status=503)
+    return ojson({"job_id": job_id})
+
 @app.route("/ocr", methods=["POST"])
 def ocr():
-    """Use Claude Vision to read letters from camera image"""
+    """Queue an OCR job from a JSON body (legacy client format)"""
     try:
         data = request.get_json(force=True, silent=True) or {}
         image_data = data.get("image", "")
-        
+
         # Remove data URL prefix if present
         if "," in image_data:
             image_data = image_data.split(",")[1]
-        
+
         if not image_data:
-            return jsonify({"error": "No image data", "letters": ""}), 400
-        
-        # Call Claude Vision
-        message = claude_client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=50,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": image_data,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": "This image shows large black letters on white paper or background. Read the letters from left to right. Only these letters are possible: A, C, E, F, I, L, M, O, P, R, S, T, V, Y. Return ONLY the letters you see, no spaces, no punctuation, no explanation. If you see no letters, return NONE."
-                        }
-                    ],
-                }
-            ],
-        )
-        
-        # Extract the letters from Claude's response
-        response_text = message.content[0].text.strip().upper()
-        
-        # Clean - only keep valid letters
-        valid_letters = set("ACEFILMOPRSTVY")
-        letters = "".join(c for c in response_text if c in valid_letters)
-        
-        print(f"[OCR] Claude saw: '{response_text}' -> cleaned: '{letters}'")
-        
-        return jsonify({"letters": letters, "raw": response_text})
-        
+            return ojson({"error": "No image data", "letters": ""}, status=400)
+
+        return enqueue_ocr(image_data, data.get("sid"))
+
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e), "letters": ""}), 500
+        return ojson({"error": str(e), "letters": ""}, status=500)
+
+@app.route("/ocr_raw", methods=["POST"])
+def ocr_raw():
+    """Raw-body variant of /ocr: the client POSTs the base64 image (or the
+    full data URL) as text/plain, so a megabyte-scale blob skips json.loads
+    and the extra full-payload string copy. The socket id for the result
+    event rides in the ?sid= query arg."""
+    try:
+        image_data = request.get_data(cache=False, as_text=True)
+
+        # The data URL prefix is short - only search the head of the payload.
+        # No comma means a malformed URL; empty it out so the 400 below fires.
+        if image_data.startswith("data:"):
+            offset = image_data.find(",", 0, 256)
+            image_data = image_data[offset + 1:] if offset != -1 else ""
+
+        if not image_data:
+            return ojson({"error": "No image data", "letters": ""}, status=400)
+
+        return enqueue_ocr(image_data, request.args.get("sid"))
+
+    except Exception as e:
+        traceback.print_exc()
+        return ojson({"error": str(e), "letters": ""}, status=500)
 
 @app.route("/start_game", methods=["POST"])
 def start_game():
     """Initialize a new game with fresh state - COMPLETE RESET"""
     try:
         data = request.get_json(force=True, silent=True) or {}
-        with lock:
-            state["pair_index"] = (state["pair_index"] + 1) % len(PAIRINGS)
-            if data.get("teamA"): state["teamA"]["name"] = data["teamA"]
-            if data.get("teamB"): state["teamB"]["name"] = data["teamB"]
-            state["teamA"]["score"] = 0
-            state["teamB"]["score"] = 0
-            state["used_words"].clear()
-            state["current_team"] = "A"
-            state["phase"] = "intro"
-            state["last_result"] = None
-            state["winning_team"] = None
-            state["bonus_submitted"] = False
-            state["last_trigger_at"] = 0.0  # Reset debounce timer
-            state["round_id"] += 1  # Invalidate any running timers
+        with phase_lock:
+            pair_index = (int(rdb.hget(K_META, "pair_index") or 0) + 1) % len(PAIRINGS)
+            with score_lock:
+                if data.get("teamA"): rdb.hset(K_NAMES, "A", data["teamA"])
+                if data.get("teamB"): rdb.hset(K_NAMES, "B", data["teamB"])
+                pipe = rdb.pipeline(transaction=False)
+                pipe.hset(K_SCORES, mapping={"A": 0, "B": 0})
+                pipe.delete(K_USED, K_USED_LIST)
+                pipe.execute()
+            rdb.hset(K_META, mapping={
+                "pair_index": pair_index,
+                "current_team": "A",
+                "phase": "intro",
+                "winning_team": "",
+                "bonus_submitted": 0,
+            })
+            with result_lock:
+                set_last_result(None)
+            rdb.delete(K_DEBOUNCE)  # Reset trigger debounce
+            rdb.incr(K_ROUND)  # Invalidate any running timers
+            bump_version()
         emit_state(force=True)
-        return jsonify({"ok": True})
+        return ojson({"ok": True})
     except Exception as e:
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, status=500)
 
 @app.route("/init_bonus", methods=["POST"])
 def init_bonus():
     """Initialize bonus round for the winning team"""
-    with lock:
-        scoreA = state["teamA"]["score"]
-        scoreB = state["teamB"]["score"]
-        
-        if scoreA >= scoreB: 
-            state["winning_team"] = "A"
-            state["current_team"] = "A"
-        else: 
-            state["winning_team"] = "B"
-            state["current_team"] = "B"
-            
-        state["phase"] = "bonus_intro"
-        state["last_result"] = None
-        state["bonus_submitted"] = False  # NEW: Reset bonus submission flag
+    with phase_lock:
+        with score_lock:
+            scores = rdb.hgetall(K_SCORES)
+            scoreA = int(scores.get("A", 0))
+            scoreB = int(scores.get("B", 0))
+
+        winner = "A" if scoreA >= scoreB else "B"
+
+        rdb.hset(K_META, mapping={
+            "winning_team": winner,
+            "current_team": winner,
+            "phase": "bonus_intro",
+            "bonus_submitted": 0,  # NEW: Reset bonus submission flag
+        })
+        with result_lock:
+            set_last_result(None)
+        bump_version()
     emit_state()
-    return jsonify({"ok": True})
+    return ojson({"ok": True})
 
 @app.route("/reset_game", methods=["POST"])
 def reset_game():
     """Reset game to intro state"""
-    with lock:
-        state["phase"] = "intro"
-        state["teamA"]["score"] = 0
-        state["teamB"]["score"] = 0
-        state["winning_team"] = None
-        state["last_result"] = None
-        state["bonus_submitted"] = False  # NEW: Reset bonus flag
+    with phase_lock:
+        with score_lock:
+            rdb.hset(K_SCORES, mapping={"A": 0, "B": 0})
+        rdb.hset(K_META, mapping={
+            "phase": "intro",
+            "winning_team": "",
+            "bonus_submitted": 0,  # NEW: Reset bonus flag
+        })
+        with result_lock:
+            set_last_result(None)
+        bump_version()
     emit_state()
-    return jsonify({"ok": True})
+    return ojson({"ok": True})
+
+# --- SUBMIT DISPATCH ---
+# The standard and bonus branches of /submit only differ in their points
+# table, minimum length, duplicate tracking, labels, and what happens once
+# the word is judged. Encode those as per-phase configs resolved by a single
+# dict lookup instead of an if/elif ladder over phase strings.
+def _end_standard(pipe, team):
+    """Hand the turn to the other team; returns the follow-up timer"""
+    pipe.hset(K_META, mapping={
+        "phase": "idle",
+        "current_team": "B" if team == "A" else "A",
+    })
+    return 5, clear_result_after_delay
+
+def _end_bonus(pipe, team):
+    """Mark the bonus as consumed; returns the game-over timer"""
+    pipe.hset(K_META, mapping={"bonus_submitted": 1, "phase": "bonus_intro"})
+    return 12, transition_to_game_over
+
+# (points_table, min_len, track_used, ok_reason, tier_fn, finish_fn)
+STANDARD_CFG = (STD_POINTS, MIN_WORD_LEN, True, "ok", tier_for_len, _end_standard)
+BONUS_CFG = (BONUS_POINTS, 5, False, "BONUS_CLEARED", str, _end_bonus)
+
+PHASE_CONFIG = {
+    "bonus_active": BONUS_CFG,
+    "bonus_scanning": BONUS_CFG,
+    "bonus_scan_failed": BONUS_CFG,
+}
 
 @app.route("/submit", methods=["POST"])
 def submit():
     """Process word submission for both standard and bonus rounds"""
     try:
         data = request.get_json(force=True, silent=True) or {}
-        word = (data.get("word") or "").strip().lower()
+        word = sys.intern((data.get("word") or "").strip().lower())
         n = len(word)
-        
-        # DEBUG: Log every submission
-        print(f"[SUBMIT] Word: '{word}' (len={n}), Phase: {state['phase']}")
-        
-        with lock:
-            team = state["current_team"]
+
+        with phase_lock:
+            meta = rdb.hgetall(K_META)
+            team = meta.get("current_team", "A")
+            phase = meta.get("phase", "intro")
+            points, min_len, track_used, ok_reason, tier_fn, finish = \
+                PHASE_CONFIG.get(phase, STANDARD_CFG)
+
+            logger.info("submit word=%r len=%d phase=%s", word, n, phase)
+
+            # The bonus word can only be played once
+            if finish is _end_bonus and meta.get("bonus_submitted") == "1":
+                return ojson({"valid": False, "points": 0, "reason": "already_submitted"}, status=400)
+
             valid = False
             reason = "unknown"
             pts = 0
-            tier = tier_for_len(n)
-            
-            # --- BONUS ROUND LOGIC ---
-            if state["phase"] in ["bonus_active", "bonus_scanning", "bonus_scan_failed"]:
-                
-                # Check if bonus already submitted
-                if state["bonus_submitted"]:
-                    return jsonify({"valid": False, "points": 0, "reason": "already_submitted"}), 400
-                
-                # 1. Check Length (Must be at least 5)
-                if n < 5:
+
+            with score_lock:
+                if n < min_len:
                     reason = "too_short"
-                # 2. Check Dictionary (Using words.txt)
                 elif word not in words:
                     reason = "not_in_dictionary"
-                else:
-                    valid = True
-                    reason = "BONUS_CLEARED"
-                    
-                    # TIERED SCORING FOR BONUS
-                    if n == 5: pts = 7
-                    elif n == 6: pts = 9
-                    elif n == 7: pts = 13
-                    elif n >= 8: pts = 20
-                    
-                    if team == "A": state["teamA"]["score"] += pts
-                    else: state["teamB"]["score"] += pts
-
-                # Result for Board
-                state["last_result"] = {
-                    "id": time.time(), "word": word, "valid": valid, 
-                    "len": n, "tier": str(n), "points": pts, "reason": reason
-                }
-                
-                # FIXED: Mark bonus as submitted and trigger end sequence
-                state["bonus_submitted"] = True
-                state["phase"] = "bonus_intro"
-                socketio.start_background_task(transition_to_game_over)
-
-            # --- STANDARD GAME LOGIC ---
-            else:
-                if n < MIN_WORD_LEN: 
-                    reason = "too_short"
-                elif word in state["used_words"]: 
+                # SADD is both the insert and the duplicate check in one
+                # round-trip; 0 means the word was already played. Runs after
+                # the dictionary check so only valid words land in the set.
+                elif track_used and not rdb.sadd(K_USED, word):
                     reason = "duplicate"
-                elif word not in words: 
-                    reason = "not_in_dictionary"
                 else:
                     valid = True
-                    pts = POINTS_BY_LEN.get(n, 0)
-                    state["used_words"].add(word)
-                    if team == "A": state["teamA"]["score"] += pts
-                    else: state["teamB"]["score"] += pts
-                    reason = "ok"
-
-                state["last_result"] = {
-                    "id": time.time(),
-                    "word": word, "valid": valid, "len": n, "tier": tier, 
-                    "points": pts, "reason": reason
-                }
-                state["phase"] = "idle"
-                state["current_team"] = "B" if team == "A" else "A"
-                socketio.start_background_task(clear_result_after_delay)
+                    reason = ok_reason
+                    pts = points[min(n, len(points) - 1)]
+
+                # Everything past the judgment is write-only: batch the word
+                # list append, score increment, result blob, phase change and
+                # version bump into one pipelined round-trip instead of five
+                # sequential commands.
+                pipe = rdb.pipeline(transaction=False)
+                if valid:
+                    if track_used:
+                        pipe.rpush(K_USED_LIST, word)
+                    pipe.hincrby(K_SCORES, team, pts)
+                with result_lock:
+                    pipe.set(K_LAST_RESULT, json.dumps({
+                        "id": time.time(), "word": word, "valid": valid,
+                        "len": n, "tier": tier_fn(n), "points": pts, "reason": reason
+                    }))
+                    delay, callback = finish(pipe, team)
+                    pipe.incr(K_VERSION)
+                    pipe.execute()
+
+            schedule(delay, callback)
 
         emit_state()
-        print(f"[RESULT] Valid: {valid}, Points: {pts}, Reason: {reason}")
-        return jsonify({"valid": valid, "points": pts, "reason": reason})
+        logger.info("result valid=%s points=%d reason=%s", valid, pts, reason)
+        return ojson({"valid": valid, "points": pts, "reason": reason})
     except Exception:
         traceback.print_exc()
-        return jsonify({"valid": False}), 500
+        return ojson({"valid": False}, status=500)
 
 @socketio.on("game_trigger")
 def on_trigger():
     """Handle button press / trigger events"""
-    now = time.time()
-    with lock:
-        # Debounce triggers (2 second cooldown)
-        if now - state["last_trigger_at"] < 2.0: 
+    changed = False
+    with phase_lock:
+        # Debounce triggers (2 second cooldown) - SET NX with a TTL is the
+        # atomic version of the old last_trigger_at timestamp compare
+        if not rdb.set(K_DEBOUNCE, 1, nx=True, px=2000):
             return
-        state["last_trigger_at"] = now
-        
-        if state["phase"] == "intro":
-            state["phase"] = "idle"
-        elif state["phase"] == "idle":
-            state["phase"] = "countdown"
-            state["last_result"] = None
-            state["round_id"] += 1  # New round - invalidates old timers
-            socketio.start_background_task(do_countdown)
-        
+
+        phase = get_phase()
+        if phase == "intro":
+            rdb.hset(K_META, "phase", "idle")
+            bump_version()
+            changed = True
+        elif phase == "idle":
+            rdb.hset(K_META, "phase", "countdown")
+            with result_lock:
+                set_last_result(None)
+            round_id = rdb.incr(K_ROUND)  # New round - invalidates old timers
+            bump_version()
+            changed = True
+            schedule(3, begin_round, round_id=round_id)
+
         # BONUS TRIGGER
-        elif state["phase"] == "bonus_intro":
-            state["phase"] = "bonus_countdown"
-            state["bonus_submitted"] = False
-            state["round_id"] += 1  # New round - invalidates old timers
-            socketio.start_background_task(do_bonus_round)
-            
-        elif state["phase"] in ["active", "bonus_active"]:
-            new_phase = "bonus_scanning" if state["phase"] == "bonus_active" else "scanning"
-            state["phase"] = new_phase
+        elif phase == "bonus_intro":
+            rdb.hset(K_META, mapping={"phase": "bonus_countdown", "bonus_submitted": 0})
+            round_id = rdb.incr(K_ROUND)  # New round - invalidates old timers
+            bump_version()
+            changed = True
+            schedule(3, begin_bonus, round_id=round_id)
+
+        elif phase in ["active", "bonus_active"]:
+            new_phase = "bonus_scanning" if phase == "bonus_active" else "scanning"
+            rdb.hset(K_META, "phase", new_phase)
+            bump_version()
+            changed = True
             socketio.emit("snapshot")
-            socketio.start_background_task(scan_watchdog)
-            
-    emit_state()
+            schedule(11, scan_watchdog, round_id=get_round_id())
+
+    # Triggers in non-matching phases mutate nothing - skip the emit entirely
+    if changed:
+        emit_state()
 
 @socketio.on("trigger_snapshot")
 def on_trigger_snapshot():
     """Manual snapshot trigger (keyboard shortcut)"""
-    with lock:
-        if state["phase"] in ["active", "countdown"]:
-            state["phase"] = "scanning"
+    changed = False
+    with phase_lock:
+        phase = get_phase()
+        if phase in ["active", "countdown"]:
+            rdb.hset(K_META, "phase", "scanning")
+            bump_version()
+            changed = True
             socketio.emit("snapshot")
-            socketio.start_background_task(scan_watchdog)
-        elif state["phase"] in ["bonus_active", "bonus_countdown"]:
-            state["phase"] = "bonus_scanning"
+            schedule(11, scan_watchdog, round_id=get_round_id())
+        elif phase in ["bonus_active", "bonus_countdown"]:
+            rdb.hset(K_META, "phase", "bonus_scanning")
+            bump_version()
+            changed = True
             socketio.emit("snapshot")
-            socketio.start_background_task(scan_watchdog)
-    emit_state()
+            schedule(11, scan_watchdog, round_id=get_round_id())
+    if changed:
+        emit_state()
 
 @socketio.on("scan_timeout")
 def on_scan_timeout():
     """Client reported scan failure"""
-    with lock: 
-        if "bonus" in state["phase"]: 
-            state["phase"] = "bonus_scan_failed"
-        else: 
-            state["phase"] = "scan_failed"
+    with phase_lock:
+        if "bonus" in get_phase():
+            rdb.hset(K_META, "phase", "bonus_scan_failed")
+        else:
+            rdb.hset(K_META, "phase", "scan_failed")
+        bump_version()
     emit_state()
 
 @socketio.on("scan_complete")
@@ -382,91 +684,95 @@ def on_scan_complete():
     """Client reported successful scan (word submitted via HTTP)"""
     # This is informational - the actual state change happens in /submit
     # But we can use this to cancel the watchdog timer logic
-    print("Scanner reported successful scan")
+    logger.info("scanner reported successful scan")
 
 @socketio.on("connect")
-def on_connect(auth=None): 
-    """Send current state to newly connected clients"""
+def on_connect(auth=None):
+    """Join the client to its role's room and send it the current state"""
+    role = request.args.get("role", "board")
+    join_room(role if role in ("board", "admin", "scanner") else "board")
     emit_state(force=True)
 
-# --- TIMERS ---
-def do_countdown():
-    """3-2-1 countdown before round starts"""
-    # Capture round_id at start - if it changes, this timer is stale
-    with lock:
-        my_round_id = state["round_id"]
-    
-    time.sleep(3)
-    with lock:
-        if state["phase"] == "countdown" and state["round_id"] == my_round_id: 
-            state["phase"] = "active"
+# --- TIMER CALLBACKS ---
+# Round staleness is handled by the scheduler's round_id check; the phase
+# checks below guard against state changes within the same round.
+def begin_round():
+    """3-2-1 countdown finished - open the 30 second round"""
+    with phase_lock:
+        if get_phase() == "countdown":
+            rdb.hset(K_META, "phase", "active")
+            bump_version()
+            schedule(30, end_round, round_id=get_round_id())
     emit_state()
-    
-    # 30 second round timer
-    time.sleep(30)
-    with lock:
-        # Only timeout if this is still the same round
-        if state["phase"] == "active" and state["round_id"] == my_round_id:
-            state["phase"] = "idle"
-            state["last_result"] = {
-                "id": time.time(), 
-                "word": "", 
-                "valid": False, 
-                "points": 0, 
-                "reason": "TIMEOUT"
-            }
-            state["current_team"] = "B" if state["current_team"] == "A" else "A"
-            socketio.start_background_task(clear_result_after_delay)
+
+def end_round():
+    """Round timer expired without a submission"""
+    with phase_lock:
+        if get_phase() == "active":
+            with result_lock:
+                set_last_result({
+                    "id": time.time(),
+                    "word": "",
+                    "valid": False,
+                    "points": 0,
+                    "reason": "TIMEOUT"
+                })
+            team = rdb.hget(K_META, "current_team") or "A"
+            rdb.hset(K_META, mapping={
+                "phase": "idle",
+                "current_team": "B" if team == "A" else "A",
+            })
+            bump_version()
+            schedule(5, clear_result_after_delay)
     emit_state()
 
-def do_bonus_round():
-    """Bonus round timer with 60 second limit"""
-    # Capture round_id at start
-    with lock:
-        my_round_id = state["round_id"]
-    
-    time.sleep(3)  # 3-2-1 countdown
-    with lock:
-        if state["phase"] == "bonus_countdown" and state["round_id"] == my_round_id: 
-            state["phase"] = "bonus_active"
+def begin_bonus():
+    """Bonus countdown finished - open the 60 second bonus round"""
+    with phase_lock:
+        if get_phase() == "bonus_countdown":
+            rdb.hset(K_META, "phase", "bonus_active")
+            bump_version()
+            schedule(60, end_bonus, round_id=get_round_id())
     emit_state()
-    
-    # 60 second bonus round
-    time.sleep(60) 
-    
-    with lock:
-        # Only timeout if still same round and not submitted
-        if state["phase"] == "bonus_active" and state["round_id"] == my_round_id and not state["bonus_submitted"]:
-            state["last_result"] = {
-                "id": time.time(), 
-                "word": "", 
-                "valid": False, 
-                "points": 0, 
-                "reason": "TIME_EXPIRED"
-            }
-            state["bonus_submitted"] = True
-            state["phase"] = "bonus_intro"
-            socketio.start_background_task(transition_to_game_over)
+
+def end_bonus():
+    """Bonus timer expired without a submission"""
+    with phase_lock:
+        meta = rdb.hgetall(K_META)
+        if meta.get("phase") == "bonus_active" and meta.get("bonus_submitted") != "1":
+            with result_lock:
+                set_last_result({
+                    "id": time.time(),
+                    "word": "",
+                    "valid": False,
+                    "points": 0,
+                    "reason": "TIME_EXPIRED"
+                })
+            rdb.hset(K_META, mapping={"bonus_submitted": 1, "phase": "bonus_intro"})
+            bump_version()
+            schedule(12, transition_to_game_over)
     emit_state()
 
 def scan_watchdog():
-    """Force scan failure after 11 seconds if no response"""
-    with lock:
-        my_round_id = state["round_id"]
-    
-    time.sleep(11)
-    with lock:
-        # Only apply if still same round
-        if state["round_id"] != my_round_id:
-            return
-        if state["phase"] == "scanning": 
-            state["phase"] = "scan_failed"
-        elif state["phase"] == "bonus_scanning": 
-            state["phase"] = "bonus_scan_failed"
-        else: 
+    """Force scan failure if the scanner hasn't responded (scheduled 11s out)"""
+    with phase_lock:
+        phase = get_phase()
+        if phase == "scanning":
+            rdb.hset(K_META, "phase", "scan_failed")
+        elif phase == "bonus_scanning":
+            rdb.hset(K_META, "phase", "bonus_scan_failed")
+        else:
             return  # Scan already completed
+        bump_version()
     emit_state()
 
+# Single greenlet that services every scheduled timer
+socketio.start_background_task(scheduler_task)
+
+# Worker pool for queued OCR jobs
+for _ in range(OCR_WORKERS):
+    socketio.start_background_task(ocr_worker)
+
 if __name__ == "__main__":
     # For local development only - Render uses gunicorn
     socketio.run(app, host="0.0.0.0", port=8000, debug=True)